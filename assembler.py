@@ -1,11 +1,14 @@
 import argparse
 from uvm_asm import full_asm, print_ir_test_mode
+from uvm_image import build_image, parse_image
 
 def main():
     parser = argparse.ArgumentParser(description="Ассемблер УВМ (вариант 14)")
     parser.add_argument("input", help="Входной ASM файл")
     parser.add_argument("output", help="Выходной бинарный файл")
     parser.add_argument("-t", "--test", action="store_true", help="Режим тестирования")
+    parser.add_argument("--raw", action="store_true", help="Записать сырой байт-код без заголовка образа")
+    parser.add_argument("--no-table", action="store_true", help="Не добавлять в образ таблицу декодированных команд")
     
     args = parser.parse_args()
     
@@ -19,10 +22,18 @@ def main():
             print_ir_test_mode(IR, bytecode)
             print(f"\n[INFO] Сгенерировано команд: {len(IR)}")
         
+        if args.raw:
+            output = bytecode
+        else:
+            output = build_image(bytecode, with_table=not args.no_table)
+            if args.test:
+                with parse_image(output) as image:
+                    print(f"[INFO] {image.describe()}")
+
         with open(args.output, 'wb') as f:
-            f.write(bytecode)
+            f.write(output)
             
-        print(f"[INFO] Успешно ассемблировано. Размер: {len(bytecode)} байт")
+        print(f"[INFO] Успешно ассемблировано. Размер: {len(output)} байт")
         
     except Exception as e:
         print(f"[ERROR] Ошибка ассемблирования: {e}")
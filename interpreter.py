@@ -4,6 +4,7 @@ from pathlib import Path
 import sys
 
 from uvm_memory import UVMMemory, OPCODE_NAMES, dump_memory_to_csv
+from uvm_image import UVMImage, is_image, parse_image, load_program
 
 
 def decode_instruction(instruction_bytes: bytes):
@@ -28,11 +29,38 @@ def decode_instruction(instruction_bytes: bytes):
     return cmd_name, b
 
 
-def run_program(bytecode: bytes, memory: UVMMemory) -> str:
+def _instruction_source(program):
+    """
+    Возвращает (число инструкций, функция выборки ip -> (cmd_name, B)).
+
+    Для образа с таблицей команды берутся из неё напрямую, без декодирования;
+    для сырого байт-кода (и образа без таблицы) — декодируются по 3 байта.
+    """
+    if isinstance(program, UVMImage) and program.has_table():
+        opcodes, operands = program.opcodes, program.operands
+
+        def fetch(ip):
+            cmd_name = OPCODE_NAMES.get(opcodes[ip])
+            if cmd_name is None:
+                raise ValueError(f"Неизвестный opcode (поле A): {opcodes[ip]}")
+            return cmd_name, operands[ip]
+
+        return program.instr_count, fetch
+
+    bytecode = program.code if isinstance(program, UVMImage) else program
+    # Разбиваем байт-код по 3 байта
+    instructions = [bytes(bytecode[i:i + 3]) for i in range(0, len(bytecode), 3)]
+    return len(instructions), lambda ip: decode_instruction(instructions[ip])
+
+
+def run_program(program, memory: UVMMemory) -> str:
     """
     Реализует основной цикл интерпретатора (стековая архитектура).
     Возвращает лог выполнения в виде строки.
 
+    program — сырой байт-код (bytes) либо образ UVMImage;
+    bytes, начинающиеся с сигнатуры образа, разбираются как образ.
+
     Команды:
       - load_const (A=14, B=константа):
           PUSH(B)
@@ -46,19 +74,22 @@ def run_program(bytecode: bytes, memory: UVMMemory) -> str:
           result = 1 if value > 0 else (-1 if value < 0 else 0)
           PUSH(result)
     """
-    # Разбиваем байт-код по 3 байта
-    instructions = [bytecode[i:i + 3] for i in range(0, len(bytecode), 3)]
+    if not isinstance(program, UVMImage) and is_image(program):
+        program = parse_image(program)
+
+    instr_count, fetch = _instruction_source(program)
     log_messages = []
 
-    log_messages.append(f"[INFO] Запуск программы. Всего инструкций: {len(instructions)}")
+    log_messages.append(f"[INFO] Запуск программы. Всего инструкций: {instr_count}")
+    if isinstance(program, UVMImage):
+        log_messages.append(f"[INFO] {program.describe()}")
     log_messages.append(f"[INFO] Начальное состояние стека: {memory.stack}")
 
-    while memory.ip < len(instructions):
-        instruction_bytes = instructions[memory.ip]
+    while memory.ip < instr_count:
         current_ip = memory.ip
 
         try:
-            cmd, operand = decode_instruction(instruction_bytes)
+            cmd, operand = fetch(current_ip)
         except Exception as e:
             log_messages.append(f"[RUNTIME ERROR] На адресе {memory.ip}: {e}")
             break
@@ -117,13 +148,21 @@ def run_program(bytecode: bytes, memory: UVMMemory) -> str:
 def parse_args():
     """Обрабатывает аргументы командной строки."""
     parser = argparse.ArgumentParser(description="UVM Interpreter (Вариант 14)")
-    parser.add_argument("program", help="Путь к бинарному файлу с ассемблированной программой.")
+    parser.add_argument(
+        "program",
+        help="Путь к бинарному файлу с ассемблированной программой (образ или сырой байт-код)."
+    )
     parser.add_argument("dump_file", help="Путь к файлу-результату для дампа памяти (CSV).")
     parser.add_argument(
         "dump_range",
         help="Диапазон адресов памяти для дампа (например, 0:10).",
         type=str
     )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Не проверять контрольную сумму образа при загрузке."
+    )
     return parser.parse_args()
 
 
@@ -140,13 +179,17 @@ def main():
         start_addr = int(start_str)
         end_addr = int(end_str)
 
-        with open(program_path, "rb") as f:
-            bytecode = f.read()
+        # Образ отображается в память, сырой формат читается целиком
+        program = load_program(program_path, verify=not args.no_verify)
 
         memory = UVMMemory()
 
         # Запуск и вывод лога в консоль
-        log = run_program(bytecode, memory)
+        try:
+            log = run_program(program, memory)
+        finally:
+            if isinstance(program, UVMImage):
+                program.close()
         print(log)
 
         # Дамп памяти после выполнения
@@ -0,0 +1,396 @@
+# uvm_image_var14.py
+"""
+Контейнерный формат предкомпилированной программы УВМ (вариант 14).
+
+Сырой program.bin — это просто поток 3-байтовых команд, который при
+каждой загрузке приходится проверять и декодировать заново. Образ
+добавляет к нему заголовок, контрольную сумму и заранее посчитанные
+метаданные, а также (опционально) выровненную таблицу уже декодированных
+команд, которую интерпретатор использует напрямую из mmap.
+
+Раскладка файла (все числа little-endian):
+
+    +0   заголовок, 32 байта (см. HEADER)
+    +32  сырой байт-код: instr_count * 3 байт
+    ...  выравнивание нулями до границы 4 байт
+    +T   таблица (если FLAG_DECODED_TABLE): instr_count записей
+         по 4 байта — uint16 opcode (поле A), uint16 операнд (поле B)
+
+Контрольная сумма — CRC32 заголовка (с обнулённым полем checksum) и всего,
+что лежит после него, так что метаданные заголовка тоже защищены.
+"""
+
+import mmap
+import struct
+import sys
+import zlib
+
+from uvm_memory import OPCODE_NAMES
+
+MAGIC = b"UVMI"
+FORMAT_VERSION = 1
+
+FLAG_DECODED_TABLE = 0x0001  # в образе есть таблица декодированных команд
+
+INSTRUCTION_SIZE = 3
+TABLE_ENTRY_SIZE = 4
+TABLE_ALIGN = 4
+
+NO_ADDRESS = 0xFFFF  # адреса не используются (поле B — максимум 15 бит)
+
+# magic, version, flags, instr_count, checksum, max_stack_depth,
+# addr_min, addr_max, code_offset, table_offset
+HEADER = struct.Struct("<4sHHIIIHHII")
+CHECKSUM_OFFSET = 12  # смещение поля checksum в заголовке
+CHECKSUM_SIZE = 4
+
+# Изменение стека для каждой команды (по полю A)
+STACK_EFFECT = {
+    14: +1,  # load_const
+    11: +1,  # read_value
+    7:  -1,  # write_value
+    4:  +1,  # sgn
+}
+
+# Команды, у которых поле B — адрес памяти данных
+ADDRESS_OPCODES = {11, 7, 4}
+
+
+class UVMImage:
+    """Загруженный образ программы: метаданные и представления байт-кода."""
+
+    def __init__(self, version, flags, instr_count, max_stack_depth,
+                 addr_min, addr_max, code, opcodes=None, operands=None,
+                 buffers=()):
+        self.version = version
+        self.flags = flags
+        self.instr_count = instr_count
+        self.max_stack_depth = max_stack_depth
+        self.addr_min = addr_min
+        self.addr_max = addr_max
+        self.code = code            # memoryview на сырой байт-код
+        self.opcodes = opcodes      # memoryview uint16 или None
+        self.operands = operands    # memoryview uint16 или None
+        self._buffers = list(buffers)  # промежуточные memoryview над данными
+        self._mapping = None        # mmap, если образ загружен из файла
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Освобождает представления байт-кода и отображение файла в память."""
+        for buf in (self.operands, self.opcodes, self.code, *reversed(self._buffers)):
+            if buf is not None:
+                buf.release()
+        self._buffers = []
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def has_table(self) -> bool:
+        """Есть ли в образе таблица, пригодная для прямого исполнения."""
+        return self.opcodes is not None
+
+    def address_range(self):
+        """Возвращает (min, max) затрагиваемых адресов или None."""
+        if self.addr_min == NO_ADDRESS:
+            return None
+        return self.addr_min, self.addr_max
+
+    def describe(self) -> str:
+        """Однострочная сводка метаданных образа для логов."""
+        address_range = self.address_range()
+        addresses = f"{address_range[0]}..{address_range[1]}" if address_range else "нет"
+        return (
+            f"Образ v{self.version}: макс. глубина стека {self.max_stack_depth}, "
+            f"адреса {addresses}, таблица команд: {'да' if self.has_table() else 'нет'}"
+        )
+
+
+def _checksum(data, end: int) -> int:
+    """CRC32 образа от начала до end с обнулённым полем checksum."""
+    with memoryview(data) as view:
+        with view[:CHECKSUM_OFFSET] as head, view[CHECKSUM_OFFSET + CHECKSUM_SIZE:end] as rest:
+            checksum = zlib.crc32(head)
+            checksum = zlib.crc32(bytes(CHECKSUM_SIZE), checksum)
+            return zlib.crc32(rest, checksum)
+
+
+def _split_instruction(instruction_bytes) -> tuple[int, int]:
+    """Разбивает 3 байта команды на поля (A, B)."""
+    value = int.from_bytes(instruction_bytes, byteorder="little")
+    return value & 0xF, value >> 4
+
+
+def analyze_bytecode(bytecode: bytes) -> tuple[int, int, int]:
+    """
+    Статически проходит байт-код и возвращает метаданные верификации:
+        (max_stack_depth, addr_min, addr_max)
+    Переходов в системе команд нет, поэтому глубина стека точная;
+    программа, снимающая значение с пустого стека, отвергается.
+    Если адреса не используются, addr_min = addr_max = NO_ADDRESS.
+    """
+    if len(bytecode) % INSTRUCTION_SIZE != 0:
+        raise ValueError(
+            f"Длина байт-кода ({len(bytecode)}) не кратна {INSTRUCTION_SIZE} байтам"
+        )
+
+    depth = 0
+    max_depth = 0
+    addr_min = NO_ADDRESS
+    addr_max = 0
+    used_address = False
+
+    for ip in range(len(bytecode) // INSTRUCTION_SIZE):
+        base = ip * INSTRUCTION_SIZE
+        a, b = _split_instruction(bytecode[base:base + INSTRUCTION_SIZE])
+        if a not in OPCODE_NAMES:
+            raise ValueError(f"Неизвестный opcode (поле A) на адресе {ip}: {a}")
+
+        depth += STACK_EFFECT[a]
+        if depth < 0:
+            raise ValueError(f"Опустошение стека на адресе {ip}: {OPCODE_NAMES[a]} при пустом стеке")
+        max_depth = max(max_depth, depth)
+
+        if a in ADDRESS_OPCODES:
+            used_address = True
+            addr_min = min(addr_min, b)
+            addr_max = max(addr_max, b)
+
+    if not used_address:
+        addr_max = NO_ADDRESS
+    return max_depth, addr_min, addr_max
+
+
+def build_image(bytecode: bytes, with_table: bool = True) -> bytes:
+    """Упаковывает сырой байт-код в контейнер с заголовком и метаданными."""
+    max_depth, addr_min, addr_max = analyze_bytecode(bytecode)
+    instr_count = len(bytecode) // INSTRUCTION_SIZE
+
+    code_offset = HEADER.size
+    body = bytearray(bytecode)
+
+    flags = 0
+    table_offset = 0
+    if with_table:
+        flags |= FLAG_DECODED_TABLE
+        padding = -(code_offset + len(body)) % TABLE_ALIGN
+        body += bytes(padding)
+        table_offset = code_offset + len(body)
+        for ip in range(instr_count):
+            base = ip * INSTRUCTION_SIZE
+            a, b = _split_instruction(bytecode[base:base + INSTRUCTION_SIZE])
+            body += struct.pack("<HH", a, b)
+
+    image = bytearray(HEADER.pack(
+        MAGIC, FORMAT_VERSION, flags, instr_count, 0, max_depth,
+        addr_min, addr_max, code_offset, table_offset,
+    ))
+    image += body
+    checksum = _checksum(image, len(image))
+    struct.pack_into("<I", image, CHECKSUM_OFFSET, checksum)
+    return bytes(image)
+
+
+def is_image(data) -> bool:
+    """Проверяет, начинаются ли данные с сигнатуры образа."""
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def parse_image(data, verify: bool = True) -> UVMImage:
+    """
+    Разбирает образ без копирования данных (подходит для bytes и mmap).
+    При verify=True сверяет контрольную сумму.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Образ короче заголовка")
+
+    (magic, version, flags, instr_count, checksum, max_depth,
+     addr_min, addr_max, code_offset, table_offset) = HEADER.unpack_from(data, 0)
+
+    if magic != MAGIC:
+        raise ValueError("Неверная сигнатура образа")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия образа: {version}")
+
+    code_end = code_offset + instr_count * INSTRUCTION_SIZE
+    if code_offset < HEADER.size or code_end > len(data):
+        raise ValueError("Образ усечён: байт-код выходит за пределы файла")
+
+    end = code_end
+    if flags & FLAG_DECODED_TABLE:
+        end = table_offset + instr_count * TABLE_ENTRY_SIZE
+        if table_offset < code_end or table_offset % TABLE_ALIGN or end > len(data):
+            raise ValueError("Образ усечён: таблица команд выходит за пределы файла")
+
+    if verify and _checksum(data, end) != checksum:
+        raise ValueError("Контрольная сумма образа не совпадает")
+
+    view = memoryview(data)
+    buffers = [view]
+    opcodes = operands = None
+    # Таблица хранится в little-endian; на big-endian хосте её нельзя
+    # отобразить напрямую, и интерпретатор декодирует сырой байт-код.
+    if flags & FLAG_DECODED_TABLE and sys.byteorder == "little":
+        table_bytes = view[table_offset:end]
+        table = table_bytes.cast("H")
+        buffers += [table_bytes, table]
+        opcodes = table[0::2]
+        operands = table[1::2]
+
+    return UVMImage(
+        version, flags, instr_count, max_depth, addr_min, addr_max,
+        view[code_offset:code_end], opcodes, operands, buffers,
+    )
+
+
+def load_program(path, verify: bool = True):
+    """
+    Загружает программу из файла.
+    Образ отображается в память через mmap и возвращается как UVMImage;
+    сырой формат возвращается как bytes.
+    Образ держит отображение открытым до вызова close().
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            return b""
+
+    if is_image(mapped):
+        try:
+            image = parse_image(mapped, verify=verify)
+        except Exception:
+            mapped.close()
+            raise
+        image._mapping = mapped
+        return image
+
+    try:
+        return mapped[:]
+    finally:
+        mapped.close()
+
+
+# --- Встроенные тесты формата ---
+
+def test_image_roundtrip():
+    """Проверяет упаковку и разбор образа на программе из задания."""
+    import os
+    import tempfile
+
+    from uvm_asm import full_asm
+    from uvm_memory import UVMMemory
+    from interpreter import run_program
+
+    try:
+        bytecode, _ = full_asm("load_const 831\nread_value 97\nwrite_value 291\nsgn 158")
+
+        for with_table in (True, False):
+            image = parse_image(build_image(bytecode, with_table=with_table))
+            assert image.instr_count == 4, "Test instr_count failed"
+            assert bytes(image.code) == bytecode, "Test code failed"
+            assert image.max_stack_depth == 2, "Test max_stack_depth failed"
+            assert image.address_range() == (97, 291), "Test address range failed"
+            assert image.has_table() == (with_table and sys.byteorder == "little"), \
+                "Test table flag failed"
+
+        image = parse_image(build_image(bytecode))
+        if image.has_table():
+            assert list(image.opcodes) == [14, 11, 7, 4], "Test opcodes failed"
+            assert list(image.operands) == [831, 97, 291, 158], "Test operands failed"
+
+        # Таблица, сырой байт-код и образ без таблицы исполняются одинаково
+        program, _ = full_asm(
+            "load_const 5\nwrite_value 3\nsgn 3\nwrite_value 10\n"
+            "read_value 3\nsgn 11\nload_const 831\nwrite_value 291"
+        )
+        states = []
+        for source in (program, build_image(program), build_image(program, with_table=False)):
+            memory = UVMMemory()
+            if is_image(source):
+                with parse_image(source) as image:
+                    run_program(image, memory)
+            else:
+                run_program(source, memory)
+            states.append((memory.stack, memory.data, memory.ip))
+        assert states[0] == states[1] == states[2], "Test run_program equivalence failed"
+        assert states[0][2] == 8 and states[0][1][10] == 1, "Test run_program result failed"
+
+        # Пустая программа
+        with parse_image(build_image(b"")) as image:
+            assert image.instr_count == 0, "Test empty instr_count failed"
+            assert image.max_stack_depth == 0, "Test empty max_stack_depth failed"
+            assert image.address_range() is None, "Test empty address range failed"
+            memory = UVMMemory()
+            run_program(image, memory)
+            assert memory.ip == 0 and memory.stack == [], "Test empty run failed"
+
+        # Усечённый образ: только заголовок, байт-код за пределами данных
+        try:
+            parse_image(build_image(bytecode)[:HEADER.size])
+            raise AssertionError("Test truncated image failed")
+        except ValueError:
+            pass
+
+        corrupted = bytearray(build_image(bytecode))
+        corrupted[HEADER.size] ^= 0xFF
+        try:
+            parse_image(bytes(corrupted))
+            raise AssertionError("Test checksum failed")
+        except ValueError:
+            pass
+
+        # Метаданные заголовка тоже покрыты контрольной суммой
+        tampered = bytearray(build_image(bytecode))
+        struct.pack_into("<I", tampered, CHECKSUM_OFFSET + CHECKSUM_SIZE, 99)
+        try:
+            parse_image(bytes(tampered))
+            raise AssertionError("Test header checksum failed")
+        except ValueError:
+            pass
+
+        underflow, _ = full_asm("write_value 5\nload_const 1")
+        try:
+            build_image(underflow)
+            raise AssertionError("Test stack underflow failed")
+        except ValueError:
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "program.bin")
+            with open(path, "wb") as f:
+                f.write(build_image(bytecode))
+            with load_program(path) as image:
+                assert bytes(image.code) == bytecode, "Test load_program failed"
+            assert image._mapping is None, "Test close failed"
+
+            with open(path, "wb") as f:
+                f.write(bytes(corrupted))
+            try:
+                load_program(path)
+                raise AssertionError("Test load_program checksum failed")
+            except ValueError:
+                pass
+
+        try:
+            build_image(bytecode[:-1])
+            raise AssertionError("Test truncated bytecode failed")
+        except ValueError:
+            pass
+
+        print("[INFO] Встроенные тесты формата образа пройдены успешно.")
+    except AssertionError as e:
+        print(f"[ERROR] Тест не пройден: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Запускаем через модуль uvm_image, чтобы interpreter и тест
+    # работали с одним и тем же классом UVMImage, а не с копией из __main__
+    import uvm_image
+    uvm_image.test_image_roundtrip()
\ No newline at end of file